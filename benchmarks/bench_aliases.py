@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""Time how long clikan takes to resolve command names, aliases and abbreviations.
+
+Every name is looked up through AliasedGroup.get_command: with no resolution
+table yet (cold), with the table cached on disk only (disk), and with the
+table already in the process (warm). The lookup clikan used before the table,
+parsing the alias files and scanning the commands, is timed as linear.
+
+Run from the repository root:
+
+    python benchmarks/bench_aliases.py [--number 10000]
+"""
+
+import argparse
+import configparser
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clikan  # noqa: E402
+
+NAMES = [
+    ('command', 'show'),
+    ('alias', 'a'),
+    ('prefix', 'tod'),
+    ('ambiguous', 're'),
+    ('unknown', 'nosuchcommand'),
+]
+
+
+def resolve(ctx, name):
+    try:
+        return clikan.clikan.get_command(ctx, name)
+    except click.UsageError:
+        return None
+
+
+def resolve_linear(ctx, name):
+    group = clikan.clikan
+    rv = click.Group.get_command(group, ctx, name)
+    if rv is not None:
+        return rv
+    aliases = {}
+    for filename in clikan.alias_files():
+        parser = configparser.RawConfigParser()
+        parser.read([filename])
+        if parser.has_section('aliases'):
+            aliases.update(parser.items('aliases'))
+    if name in aliases:
+        return click.Group.get_command(group, ctx, aliases[name])
+    matches = [x for x in group.list_commands(ctx) if x.lower().startswith(name.lower())]
+    if len(matches) == 1:
+        return click.Group.get_command(group, ctx, matches[0])
+    return None
+
+
+def timed(fn, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+def run(number):
+    home = tempfile.mkdtemp(prefix='clikan-bench-')
+    os.environ['CLIKAN_HOME'] = home
+    with open(os.path.join(home, clikan.ALIAS_FILE), 'w') as stream:
+        stream.write('[aliases]\nls=show\n')
+    cache = os.path.join(home, clikan.CACHE_DIR, clikan.ALIAS_CACHE)
+    ctx = click.Context(clikan.clikan, info_name='clikan')
+
+    def cold(name):
+        clikan.clikan._resolution = None
+        if os.path.exists(cache):
+            os.remove(cache)
+        resolve(ctx, name)
+
+    def disk(name):
+        clikan.clikan._resolution = None
+        resolve(ctx, name)
+
+    modes = [
+        ('linear', lambda name: resolve_linear(ctx, name)),
+        ('cold', cold),
+        ('disk', disk),
+        ('warm', lambda name: resolve(ctx, name)),
+    ]
+    try:
+        print('%-10s %-14s' % ('kind', 'name') + ''.join('%12s' % ('%s (us)' % mode) for mode, _ in modes))
+        for kind, name in NAMES:
+            times = [timed(lambda: fn(name), number) for _, fn in modes]
+            print('%-10s %-14s' % (kind, name) + ''.join('%12.2f' % (t * 1e6) for t in times))
+    finally:
+        shutil.rmtree(home)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=10000, help="Lookups timed per name and mode")
+    args = parser.parse_args()
+    run(args.number)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""Time clikan commands end to end on synthetic projects.
+
+Every command runs through CliRunner against a fresh copy of a generated
+CLIKAN_HOME, after a warm-up `show` so the parse cache is in place, like
+it would be for a board in daily use. Timings are the best of --repeat
+runs; peak memory comes from one extra run under tracemalloc, with
+--jobs 1 for the --all commands: tracemalloc only sees this process, not
+the workers that would otherwise share the projects.
+
+Run from the repository root:
+
+    python benchmarks/bench_commands.py [--sizes 100 1000 10000 100000 1000000]
+        [--output results.json] [--compare previous.json]
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from click.testing import CliRunner
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clikan  # noqa: E402
+from bench_yaml import synthetic_board  # noqa: E402
+
+COMMANDS = [
+    ('show', ['show']),
+    ('today', ['today']),
+    ('add', ['add', 'benchmark task']),
+    ('promote', ['promote', '{todo}']),
+    ('edit', ['edit', '{todo}', '--desc', 'benchmark description']),
+    ('delete', ['delete', '{todo}']),
+    ('refresh', ['refresh']),
+    ('refresh --all', ['refresh', '--all']),
+    ('show --all', ['show', '--all']),
+]
+
+
+def write_project(home: str, name: str, board: dict):
+    data = os.path.join(home, '.%s.dat' % name)
+    with open(os.path.join(home, '.%s.yaml' % name), 'w') as config:
+        config.write('clikan_data: %s\n' % data)
+    with open(data, 'w') as stream:
+        clikan.dump_rows(board, stream)
+
+
+def build_home(root: str, size: int, projects: int) -> tuple[str, dict]:
+    """Generate a CLIKAN_HOME with a default project of size tasks, and
+    projects - 1 more sharing another size tasks for the --all commands"""
+    home = os.path.join(root, 'template-%d' % size)
+    os.makedirs(home)
+    with open(os.path.join(home, '.current'), 'w') as current:
+        current.write('default')
+    board = synthetic_board(size)
+    write_project(home, 'default', board)
+    for i in range(1, projects):
+        write_project(home, 'project%d' % i, synthetic_board(max(size // (projects - 1), 1), seed=i))
+    todo = next(k for k, row in board['data'].items() if row[0] == 'todo')
+    return home, {'todo': todo}
+
+
+def run_command(runner: CliRunner, template: str, root: str, argv: list, trace: bool = False) -> tuple[float, int]:
+    home = tempfile.mkdtemp(dir=root)
+    shutil.copytree(template, home, dirs_exist_ok=True)
+    clikan._loaded_rows.clear()
+    env = {'CLIKAN_HOME': home}
+    runner.invoke(clikan.clikan, ['show'], env=env, catch_exceptions=False)
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = runner.invoke(clikan.clikan, argv, env=env, catch_exceptions=False)
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    shutil.rmtree(home)
+    if result.exit_code:
+        raise SystemExit('%s failed: %s' % (' '.join(argv), result.output))
+    return elapsed, peak
+
+
+def run(sizes, repeat, projects, commands):
+    runner = CliRunner()
+    results = []
+    root = tempfile.mkdtemp(prefix='clikan-bench-')
+    try:
+        print('%9s %-14s %10s %12s' % ('tasks', 'command', 'time (s)', 'peak (MiB)'))
+        for size in sizes:
+            template, ids = build_home(root, size, projects)
+            for name, argv in COMMANDS:
+                if commands and name not in commands:
+                    continue
+                argv = [arg.format(**ids) for arg in argv]
+                runs = [run_command(runner, template, root, argv)[0] for _ in range(repeat)]
+                traced = argv + ['--jobs', '1'] if '--all' in argv else argv
+                peak = run_command(runner, template, root, traced, trace=True)[1]
+                results.append({'command': name, 'tasks': size, 'seconds': min(runs),
+                                'runs': runs, 'peak_bytes': peak})
+                print('%9d %-14s %10.3f %12.1f' % (size, name, min(runs), peak / 2**20))
+            shutil.rmtree(template)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare(results, previous):
+    """Print the time ratio of each result against the same one in a previous run"""
+    before = {(r['command'], r['tasks']): r for r in previous['results']}
+    print('\n%9s %-14s %10s %10s %7s' % ('tasks', 'command', 'before', 'now', 'ratio'))
+    for r in results:
+        old = before.get((r['command'], r['tasks']))
+        if old:
+            print('%9d %-14s %10.3f %10.3f %6.2fx' % (r['tasks'], r['command'], old['seconds'],
+                                                    r['seconds'], r['seconds'] / old['seconds']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--projects', type=int, default=4, help="Projects in the home, for the --all commands")
+    parser.add_argument('--command', dest='commands', action='append', choices=[name for name, _ in COMMANDS],
+                        help="Only time this command, may be given more than once")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', type=argparse.FileType('r'), help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.repeat, args.projects, args.commands)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump({
+                'clikan': clikan.get_version(),
+                'python': platform.python_version(),
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'repeat': args.repeat,
+                'results': results,
+            }, stream, indent=2)
+    if args.compare:
+        compare(results, json.load(args.compare))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Compare the pure-Python and libyaml paths used by read_data/write_data.
+
+Run from the repository root:
+
+    python benchmarks/bench_yaml.py [--sizes 1000 10000 100000]
+"""
+
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clikan  # noqa: E402
+
+
+def synthetic_board(size: int, seed: int = 0) -> dict:
+    """Build a formatted board the way write_data lays it out on disk."""
+    rng = random.Random(seed)
+    statuses = ['todo', 'inprogress', 'done']
+    data = {}
+    for i in range(1, size + 1):
+        data[i] = [
+            rng.choice(statuses),
+            'task %d %s' % (i, 'x' * rng.randint(0, 30)),
+            '2024-03-%02d 10:%02d:00' % (rng.randint(1, 28), rng.randint(0, 59)),
+            None if rng.random() < 0.5 else '2024-04-%02d 09:00:00' % rng.randint(1, 28),
+            '' if rng.random() < 0.8 else 'a longer description of task %d' % i,
+        ]
+    deleted = {size + i: ['deleted', 'gone %d' % i, '2024-01-01 00:00:00', None, '']
+               for i in range(1, size // 10 + 1)}
+    return {'data': data, 'deleted': deleted}
+
+
+def timed(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, repeat):
+    paths = [('python', yaml.SafeLoader, yaml.SafeDumper)]
+    if yaml.__with_libyaml__:
+        paths.append(('libyaml', yaml.CSafeLoader, yaml.CSafeDumper))
+    else:
+        print('libyaml not available, only timing the pure-Python path')
+
+    print('%8s %-8s %10s %10s' % ('tasks', 'path', 'load (s)', 'dump (s)'))
+    for size in sizes:
+        board = synthetic_board(size)
+        outputs = []
+        for name, loader, dumper in paths:
+            def dump():
+                return yaml.dump(board, Dumper=dumper, default_flow_style=False,
+                                 allow_unicode=True, width=clikan.YAML_WIDTH)
+            text = dump()
+            outputs.append(text)
+            load_time = timed(lambda: yaml.load(io.StringIO(text), Loader=loader), repeat)
+            dump_time = timed(dump, repeat)
+            print('%8d %-8s %10.3f %10.3f' % (size, name, load_time, dump_time))
+        if len(set(outputs)) != 1:
+            raise SystemExit('serialized output differs between paths for %d tasks' % size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
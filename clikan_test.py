@@ -3,6 +3,7 @@
 import click
 from click.testing import CliRunner
 from clikan import configure, clikan, add, promote, show, regress, delete, refresh, read_data, read_config_yaml, write_data
+import io
 import os
 import pathlib
 import tempfile
@@ -24,6 +25,27 @@ def add_three_tasks():
     runner = CliRunner()
     runner.invoke(add, ["n_--task_test_multi_1", "n_--task_test_multi_2", "n_--task_test_multi_3"])
 
+@pytest.fixture
+def clikan_home(tmp_path):
+    """Return a function setting up a CLIKAN_HOME in tmp_path with the given project
+
+    config is appended to the project's .yaml after its clikan_data line;
+    backend picks the data file: yaml, journal (yaml with the journal on)
+    or sqlite. data, when given, is used as clikan_data as is.
+    """
+    def make_home(config="", project="default", backend="yaml", data=None):
+        if data is None:
+            if backend == "sqlite":
+                data = "sqlite:///%s" % (tmp_path / (".%s.db" % project))
+            else:
+                data = tmp_path / (".%s.dat" % project)
+        if backend == "journal":
+            config = "journal: true\n" + config
+        (tmp_path / ".current").write_text(project)
+        (tmp_path / (".%s.yaml" % project)).write_text("clikan_data: %s\n%s" % (data, config))
+        return tmp_path
+    return make_home
+
 # Configure Tests
 
 
@@ -271,3 +293,1027 @@ def test_no_taskname_config_option():
         result = runner.invoke(clikan, ["a", "This is a long task name, more than 40 characters (66 to be exact)"])
         assert result.exit_code == 0
         assert 'Brevity counts:' in result.output
+
+
+# Serialization tests
+
+@pytest.mark.parametrize("task", ["héllo: \"q\"", "Fix \U0001F41B in parser", "next\x85line"])
+def test_dump_yaml_matches_pure_python_emitter(task):
+    import yaml
+    from clikan import dump_yaml, YAML_WIDTH
+    data = {"data": {1: ["todo", task, "2024-Jan-01 10:00:00", None, "two\nlines"]},
+            "deleted": {}}
+    expected = yaml.dump(data, Dumper=yaml.SafeDumper, default_flow_style=False,
+                         allow_unicode=True, width=YAML_WIDTH)
+    assert dump_yaml(data) == expected
+
+
+# Journal Tests
+
+def test_journal_appends_changes(clikan_home):
+    journal_home = clikan_home(backend="journal")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(journal_home)}):
+        runner.invoke(clikan, ["add", "journaled"])
+        runner.invoke(clikan, ["promote", "1"])
+
+        data_file = journal_home / ".default.dat"
+        assert "journaled" not in data_file.read_text()
+        assert "journaled" in (journal_home / ".default.dat.journal").read_text()
+
+        dd = read_data(read_config_yaml())
+        assert dd["data"][1].task == "journaled"
+        assert dd["data"][1].status == "inprogress"
+
+        result = runner.invoke(clikan, ["refresh"])
+        assert result.exit_code == 0
+        assert not (journal_home / ".default.dat.journal").exists()
+        assert "journaled" in data_file.read_text()
+
+
+def test_journal_append_after_torn_record(clikan_home):
+    journal_home = clikan_home(backend="journal")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(journal_home)}):
+        runner.invoke(clikan, ["add", "one"])
+        journal = journal_home / ".default.dat.journal"
+        with journal.open("a") as stream:
+            stream.write('["data", 2, ["todo", "tor')
+
+        result = runner.invoke(clikan, ["add", "two"])
+        assert result.exit_code == 0
+        runner.invoke(clikan, ["promote", "1"])
+
+        assert "tor" not in journal.read_text()
+        dd = read_data(read_config_yaml())
+        assert [entry.task for entry in dd["data"].values()] == ["one", "two"]
+        assert dd["data"][1].status == "inprogress"
+
+
+# SQLite Tests
+
+def test_sqlite_backend(clikan_home):
+    sqlite_home = clikan_home(backend="sqlite")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(sqlite_home)}):
+        runner.invoke(clikan, ["add", "stored in sqlite"])
+        runner.invoke(clikan, ["add", "due soon", "--date", "today"])
+        runner.invoke(clikan, ["promote", "1"])
+        runner.invoke(clikan, ["delete", "2"])
+
+        dd = read_data(read_config_yaml())
+        assert dd["data"][1].status == "inprogress"
+        assert dd["deleted"][2].task == "due soon"
+
+        result = runner.invoke(clikan, ["show"])
+        assert "stored in sqlite" in result.output
+        assert "due soon" not in result.output
+
+
+def test_delproj_sqlite_project(tmp_path, clikan_home):
+    clikan_home(project="gone", backend="sqlite")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "stored in sqlite"])
+        assert (tmp_path / ".gone.db").exists()
+        result = runner.invoke(clikan, ["delproj", "gone"], input="y\n")
+        assert result.exit_code == 0, result.output
+        assert "Deleted project gone" in result.output
+    assert not (tmp_path / ".gone.db").exists()
+    assert not (tmp_path / ".gone.yaml").exists()
+    assert (tmp_path / ".current").read_text() == "default"
+
+
+def test_delproj_removes_sidecar_files(tmp_path, clikan_home):
+    clikan_home("archive:\n  done_days: 0\n", project="gone", backend="journal")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "finished"])
+        runner.invoke(clikan, ["promote", "1", "1"])
+        runner.invoke(clikan, ["add", "open"])
+        runner.invoke(clikan, ["search", "open"])
+        runner.invoke(clikan, ["refresh"])
+        assert {".gone.dat.archive", ".gone.dat.lock", ".gone.dat.search.json"} <= {p.name for p in tmp_path.iterdir()}
+        assert list((tmp_path / ".cache").glob("*.bin"))
+        assert runner.invoke(clikan, ["delproj", "gone"], input="y\n").exit_code == 0
+
+        assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".gone")] == []
+        assert list((tmp_path / ".cache").glob("*.bin")) == []
+        clikan_home("archive:\n  done_days: 0\n", project="gone")
+        result = runner.invoke(clikan, ["archive", "search", "finished"])
+        assert "No archived tasks match." in result.output
+
+
+def test_migrate_to_sqlite(tmp_path, clikan_home):
+    clikan_home()
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "first"])
+        runner.invoke(clikan, ["add", "second", "--date", "2000-01-01"])
+        runner.invoke(clikan, ["delete", "1"])
+        assert "second" in runner.invoke(clikan, ["today", "--all"]).output
+
+        result = runner.invoke(clikan, ["migrate"])
+        assert result.exit_code == 0
+        assert read_config_yaml()["clikan_data"].startswith("sqlite:///")
+        assert "second" in runner.invoke(clikan, ["today", "--all"]).output
+
+        dd = read_data(read_config_yaml())
+        assert dd["data"][2].task == "second"
+        assert dd["data"][2].target_date is not None
+        assert dd["deleted"][1].task == "first"
+
+        result = runner.invoke(clikan, ["today"])
+        assert "second" in result.output
+
+
+def test_migrate_keeps_existing_database(tmp_path, monkeypatch, clikan_home):
+    fcntl = pytest.importorskip("fcntl")
+    import clikan as module
+    clikan_home(project="other", backend="sqlite")
+    clikan_home()
+    target = "sqlite:///%s" % (tmp_path / ".other.db")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["switch", "other"])
+        runner.invoke(clikan, ["add", "precious"])
+        runner.invoke(clikan, ["switch", "default"])
+        runner.invoke(clikan, ["add", "moving"])
+
+        result = runner.invoke(clikan, ["migrate", "--to", target])
+        assert "already holds 1 tasks, use --force" in result.output
+        assert not read_config_yaml()["clikan_data"].startswith("sqlite:///")
+        assert read_data(read_config_yaml("other"))["data"][1].task == "precious"
+
+        held = []
+        apply_sqlite_changes = module.apply_sqlite_changes
+
+        def check_lock(*args):
+            with open(tmp_path / ".default.dat.lock", "a") as stream:
+                try:
+                    fcntl.flock(stream.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    held.append(False)
+                except OSError:
+                    held.append(True)
+            return apply_sqlite_changes(*args)
+        monkeypatch.setattr(module, "apply_sqlite_changes", check_lock)
+        result = runner.invoke(clikan, ["migrate", "--to", target, "--force"])
+        assert result.exit_code == 0, result.output
+        assert held and all(held)
+        assert read_data(read_config_yaml())["data"][1].task == "moving"
+
+
+# Startup Tests
+
+# Startup is measured against importing click in the same run, so the check
+# scales with the speed of the machine instead of a wall-clock budget.
+IMPORT_BUDGET_RATIO = float(os.environ.get("CLIKAN_IMPORT_BUDGET_RATIO", 5))
+
+
+def test_version_cold_start():
+    import subprocess
+    import sys
+    script = "import sys; sys.argv = ['clikan', '--version']; import clikan; clikan.clikan()"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                            capture_output=True, text=True)
+    assert result.returncode == 0
+
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative_us[name.strip()] = int(cumulative)
+
+    for heavy in ("rich", "pydantic", "yaml", "sqlite3"):
+        assert heavy not in cumulative_us
+    assert cumulative_us["clikan"] < IMPORT_BUDGET_RATIO * cumulative_us["click"]
+
+
+# Cache Tests
+
+def test_cache_roundtrip_and_invalidation(tmp_path, clikan_home):
+    from clikan import cache_path, read_cache
+    clikan_home()
+    data_file = tmp_path / ".default.dat"
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "cached"])
+        runner.invoke(clikan, ["edit", "1", "--date", "2030-01-01", "--desc", "with\nnewline"])
+
+        rows = read_cache(str(data_file), os.stat(data_file))
+        assert rows["data"][1][1] == "cached"
+        assert rows["data"][1][4] == "with\nnewline"
+        assert pathlib.Path(cache_path(str(data_file))).parent == tmp_path / ".cache"
+
+        data_file.write_text("data:\n  7:\n  - todo\n  - edited by hand\n  - x\n  - null\n  - ''\ndeleted: {}\n")
+        assert read_cache(str(data_file), os.stat(data_file)) is None
+        dd = read_data(read_config_yaml())
+        assert list(dd["data"]) == [7]
+        assert dd["data"][7].target_date is None
+
+
+# Entry Tests
+
+def test_entry_validation_at_input():
+    import pydantic
+    from clikan import Entry, validate_entry
+    entry = validate_entry(task="t", status="todo", last_updated="x", target_date=None, desc="")
+    assert isinstance(entry, Entry)
+    assert entry.copy() == entry
+    with pytest.raises(pydantic.ValidationError):
+        validate_entry(task=None, status="todo", last_updated="x", target_date=None, desc="")
+
+
+# Daemon Tests
+
+def test_serve_answers_commands(tmp_path, clikan_home):
+    import subprocess
+    import sys
+    clikan_home()
+    data_file = tmp_path / ".default.dat"
+    env = dict(os.environ, CLIKAN_HOME=str(tmp_path))
+    command = [sys.executable, "-c", "import clikan; clikan.main()"]
+
+    daemon = subprocess.Popen(command + ["serve", "--debounce", "0.1"], env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        assert "listening" in daemon.stdout.readline()
+        result = subprocess.run(command + ["add", "served"], env=env, capture_output=True, text=True)
+        assert "Creating new task w/ id: 1 -> served" in result.stdout
+        result = subprocess.run(command + ["p", "1"], env=env, capture_output=True, text=True)
+        assert "Promoting task 1 to in-progress." in result.stdout
+    finally:
+        daemon.terminate()
+        daemon.wait(10)
+
+    assert not (tmp_path / ".clikan.sock").exists()
+    dd = read_data({"clikan_data": str(data_file)})
+    assert dd["data"][1].status == "inprogress"
+
+
+def test_serve_flushes_before_local_commands(tmp_path, clikan_home):
+    import subprocess
+    import sys
+    clikan_home()
+    env = dict(os.environ, CLIKAN_HOME=str(tmp_path))
+    command = [sys.executable, "-c", "import clikan; clikan.main()"]
+
+    daemon = subprocess.Popen(command + ["serve", "--debounce", "60"], env=env,
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        assert "listening" in daemon.stdout.readline()
+        subprocess.run(command + ["add", "via daemon"], env=env, capture_output=True, text=True)
+        result = subprocess.run(command + ["search", "daemon"], env=env, capture_output=True, text=True)
+        assert result.stdout == "[1] via daemon (todo)\n"
+        result = subprocess.run(command + ["batch"], input="promote 1\n", env=env, capture_output=True, text=True)
+        assert "Promoting task 1 to in-progress." in result.stdout
+        result = subprocess.run(command + ["show"], env=env, capture_output=True, text=True)
+        assert "via daemon" in result.stdout
+        result = subprocess.run(command + ["export"], env=env, capture_output=True, text=True)
+        assert '"status": "inprogress"' in result.stdout
+    finally:
+        daemon.terminate()
+        daemon.wait(10)
+
+
+# All Projects Tests
+
+@pytest.fixture
+def many_projects_home(clikan_home):
+    for i in reversed(range(4)):
+        tmp_path = clikan_home(project="p%d" % i)
+        (tmp_path / (".p%d.dat" % i)).write_text(
+            "data:\n  1:\n  - todo\n  - task of p%d\n  - x\n  - null\n  - ''\n"
+            "  2:\n  - done\n  - done of p%d\n  - x\n  - null\n  - ''\ndeleted: {}\n" % (i, i))
+    return tmp_path
+
+
+def test_show_all_parallel_keeps_order(many_projects_home):
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(many_projects_home)}):
+        sequential = runner.invoke(clikan, ["show", "--all", "--jobs", "1"])
+        parallel = runner.invoke(clikan, ["show", "--all", "--jobs", "3"])
+        assert parallel.exit_code == 0
+        assert parallel.output == sequential.output
+        positions = [parallel.output.index("task of p%d" % i) for i in range(4)]
+        assert positions == sorted(positions)
+
+
+def test_refresh_all_parallel(many_projects_home):
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(many_projects_home)}):
+        result = runner.invoke(clikan, ["refresh", "--all", "-j", "2"])
+        assert result.exit_code == 0
+        for i in range(4):
+            dd = read_data(read_config_yaml("p%d" % i))
+            assert [e.task for e in dd["data"].values()] == ["task of p%d" % i]
+
+
+# Due Index Tests
+
+def test_due_index_today_all(many_projects_home):
+    import json
+    runner = CliRunner()
+    index_file = many_projects_home / ".due.json"
+    with runner.isolation(env={"CLIKAN_HOME": str(many_projects_home)}):
+        result = runner.invoke(clikan, ["today", "--all"])
+        assert result.exit_code == 0
+        assert "task of" not in result.output
+        assert json.loads(index_file.read_text()) == {}
+
+        runner.invoke(clikan, ["switch", "p2"])
+        runner.invoke(clikan, ["edit", "1", "--date", "2000-01-01"])
+        assert len(json.loads(index_file.read_text())) == 1
+
+        result = runner.invoke(clikan, ["today", "--all"])
+        assert "task of p2" in result.output
+        assert "task of p1" not in result.output
+
+        runner.invoke(clikan, ["delete", "1"])
+        assert json.loads(index_file.read_text()) == {}
+
+        runner.invoke(clikan, ["add", "later", "--date", "2100-01-01"])
+        index_file.unlink()
+        result = runner.invoke(clikan, ["reindex"])
+        assert "Indexed 1 dated tasks in 1 projects." in result.output
+
+
+def test_due_index_updated_under_data_lock(tmp_path, monkeypatch, clikan_home):
+    fcntl = pytest.importorskip("fcntl")
+    import clikan as module
+    clikan_home()
+    held = []
+    update_due_index = module.update_due_index
+
+    def check_lock(*args):
+        with open(tmp_path / ".default.dat.lock", "a") as stream:
+            try:
+                fcntl.flock(stream.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                held.append(False)
+            except OSError:
+                held.append(True)
+        return update_due_index(*args)
+    monkeypatch.setattr(module, "update_due_index", check_lock)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "dated", "--date", "2000-01-01"])
+    assert held == [True]
+
+
+# Split Tests
+
+def test_split_items_today_uses_date_index():
+    import datetime
+    from clikan import Entry, split_items, timestamp
+    now = datetime.datetime.now()
+    dd = {"data": {
+        1: Entry("overdue", "todo", "x", timestamp(now - datetime.timedelta(days=3))),
+        2: Entry("undated", "todo", "x", None),
+        3: Entry("due today", "inprogress", "x", timestamp(now), "desc"),
+        4: Entry("future", "done", "x", timestamp(now + datetime.timedelta(days=3))),
+    }, "deleted": {}}
+
+    todos, inprogs, dones = split_items(dd, today=True)
+    assert todos == ["[bold red][1] overdue[/bold red]"]
+    assert inprogs == ["[bold blue][3*] due today[/bold blue]"]
+    assert dones == []
+
+    index = dd["due_index"]
+    todos, inprogs, dones = split_items(dd)
+    assert dd["due_index"] is index
+    assert todos == ["[bold red][1] overdue[/bold red]", "[2] undated"]
+    assert dones == ["[4] future"]
+
+
+# Archive Tests
+
+@pytest.mark.parametrize("compress, extension", [("gzip", ".gz"), ("lzma", ".xz"), ("none", "")])
+def test_archive_search_restore(tmp_path, clikan_home, compress, extension):
+    clikan_home("archive:\n  done_days: 0\n  compress: %s\n  segment_size: 2\n" % compress)
+    data_file = tmp_path / ".default.dat"
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        for task in ["write report", "file taxes", "call bob"]:
+            runner.invoke(clikan, ["add", task])
+        runner.invoke(clikan, ["delete", "1"])
+        runner.invoke(clikan, ["promote", "2", "3"])
+        runner.invoke(clikan, ["promote", "2", "3"])
+
+        assert "report" not in data_file.read_text()
+        assert "taxes" not in data_file.read_text()
+        segments = sorted(p.name for p in (tmp_path / ".default.dat.archive").glob("segment-*"))
+        assert segments == ["segment-000001.jsonl" + extension, "segment-000002.jsonl" + extension]
+
+        result = runner.invoke(clikan, ["archive", "search", "TAXES"])
+        assert "[2] file taxes (task 2, done" in result.output
+
+        result = runner.invoke(clikan, ["archive", "restore", "1"])
+        # Ids are not handed out twice, even after the task left the board.
+        assert "Restored archived task 1 as task 4 -> write report" in result.output
+        assert read_data(read_config_yaml())["data"][4].status == "todo"
+        result = runner.invoke(clikan, ["archive", "search", "report"])
+        assert "No archived tasks match." in result.output
+
+
+def test_archive_follows_refresh_and_migrate(tmp_path, clikan_home):
+    clikan_home("archive:\n  done_days: 30\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "finished"])
+        runner.invoke(clikan, ["add", "open"])
+        runner.invoke(clikan, ["promote", "1", "1"])
+        assert "No archived tasks match." in runner.invoke(clikan, ["archive", "search", "finished"]).output
+
+        runner.invoke(clikan, ["refresh"])
+        assert list(read_data(read_config_yaml())["data"]) == [2]
+        assert "[1] finished (task 1, done" in runner.invoke(clikan, ["archive", "search", "finished"]).output
+
+        assert runner.invoke(clikan, ["migrate"]).exit_code == 0
+        assert "[1] finished (task 1, done" in runner.invoke(clikan, ["archive", "search", "finished"]).output
+        result = runner.invoke(clikan, ["archive", "restore", "1"])
+        assert "Restored archived task 1 as task 3 -> finished" in result.output
+
+
+# Batch Tests
+
+def test_batch_single_write_and_limits(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home("repaint: true\nlimits:\n  todo: 3\n  wip: 1\n")
+    saves = []
+    save_data = module.save_data
+    monkeypatch.setattr(module, "save_data", lambda *args, **kwargs: saves.append(args) or save_data(*args, **kwargs))
+    script = "\n".join([
+        "# comments and blank lines are skipped",
+        "",
+        "add one",
+        "a 'two words' --date tomorrow",
+        "add three",
+        "add four",
+        "promote 1 2",
+        "edit 3 --desc 'more detail'",
+        "delete 3",
+    ])
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        read_data(read_config_yaml())
+        saves.clear()
+        result = runner.invoke(clikan, ["batch"], input=script)
+        assert result.exit_code == 0
+        assert "No new todos, limit reached already." in result.output
+        assert "Can not promote, in-progress limit of 1 reached." in result.output
+        assert "Applied 7 operations." in result.output
+        assert result.output.count("clikan (default)") == 1
+        assert len(saves) == 1
+
+        dd = read_data(read_config_yaml())
+        assert [(k, v.task, v.status) for k, v in dd["data"].items()] == [
+            (1, "one", "inprogress"), (2, "two words", "todo")]
+
+
+def test_batch_rejects_bad_lines(tmp_path, clikan_home):
+    clikan_home()
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        result = runner.invoke(clikan, ["batch"], input="add fine\nswitch other\n")
+        assert result.exit_code == 1
+        assert "Line 2:" in result.output
+        assert read_data(read_config_yaml())["data"] == {}
+
+
+# Import/Export Tests
+
+@pytest.mark.parametrize("fmt", ["jsonl", "csv"])
+@pytest.mark.parametrize("target", ["yaml", "sqlite"])
+def test_export_import_roundtrip(tmp_path, clikan_home, fmt, target):
+    clikan_home(project="dst", backend=target)
+    clikan_home(project="src")
+    export_file = tmp_path / ("tasks." + fmt)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "plain"])
+        runner.invoke(clikan, ["add", "dated, \"quoted\"", "--date", "2030-01-02"])
+        runner.invoke(clikan, ["edit", "2", "--desc", "multi\nline"])
+        runner.invoke(clikan, ["add", "gone"])
+        runner.invoke(clikan, ["delete", "3"])
+
+        result = runner.invoke(clikan, ["export", "--deleted", str(export_file)])
+        assert result.exit_code == 0
+        src = read_data(read_config_yaml("src"))
+
+        runner.invoke(clikan, ["switch", "dst"])
+        runner.invoke(clikan, ["add", "already there"])
+        result = runner.invoke(clikan, ["import", str(export_file)])
+        assert "Imported 3 tasks." in result.output
+
+        dst_data = read_data(read_config_yaml("dst"))
+        assert dst_data["data"][1].task == "already there"
+        assert dst_data["data"][2] == src["data"][1]
+        assert dst_data["data"][3] == src["data"][2]
+        assert dst_data["deleted"][4] == src["deleted"][3]
+
+
+def test_import_validates_records(tmp_path, clikan_home):
+    clikan_home()
+    source = tmp_path / "in.jsonl"
+    source.write_text('{"task": "ok", "target_date": "2030-01-02T10:00:00"}\n{"status": "todo"}\n')
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        result = runner.invoke(clikan, ["import", str(source)])
+        assert result.exit_code == 1
+        assert "nothing imported" in result.output
+        assert read_data(read_config_yaml())["data"] == {}
+
+        source.write_text('{"task": "ok", "target_date": "2030-01-02T10:00:00"}\n')
+        runner.invoke(clikan, ["import", str(source)])
+        assert read_data(read_config_yaml())["data"][1].target_date == "2030-01-02 10:00:00"
+
+
+# Concurrency Tests
+
+def run_elsewhere(home, *argv):
+    """Run a clikan command in another process, as a concurrent writer would"""
+    import multiprocessing
+    process = multiprocessing.get_context("fork").Process(target=stress_command, args=(home, argv))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+
+
+def stress_command(home, argv):
+    os.environ["CLIKAN_HOME"] = home
+    result = CliRunner().invoke(clikan, list(argv))
+    assert result.exit_code == 0, result.output
+
+
+def test_stale_save_merges_disjoint_changes(tmp_path, clikan_home):
+    import clikan as module
+    clikan_home()
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        config = read_config_yaml()
+        runner.invoke(clikan, ["add", "one"])
+        stale = read_data(config)
+        run_elsewhere(str(tmp_path), "add", "two")
+        stale["data"][1].status = "inprogress"
+        write_data(config, stale)
+        assert [(v.task, v.status) for v in read_data(config)["data"].values()] == [
+            ("one", "inprogress"), ("two", "todo")]
+
+        stale = read_data(config)
+        run_elsewhere(str(tmp_path), "edit", "2", "--task", "theirs")
+        stale["data"][2].task = "ours"
+        with pytest.raises(module.WriteConflict):
+            write_data(config, stale)
+
+
+def test_retried_command_reports_only_the_saved_attempt(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home()
+    allocate_id = module.allocate_id
+    interrupted = []
+
+    def allocate_after_concurrent_add(dd):
+        if not interrupted:
+            interrupted.append(True)
+            run_elsewhere(str(tmp_path), "add", "theirs")
+        return allocate_id(dd)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "one"])
+        monkeypatch.setattr(module, "allocate_id", allocate_after_concurrent_add)
+        result = runner.invoke(clikan, ["add", "mine"])
+        assert result.exit_code == 0
+        assert result.output == "Creating new task w/ id: 3 -> mine\n"
+        dd = read_data(read_config_yaml())
+        assert {k: v.task for k, v in dd["data"].items()} == {1: "one", 2: "theirs", 3: "mine"}
+
+
+def stress_worker(home, worker, count):
+    for i in range(count):
+        stress_command(home, ["add", "w%d-%d" % (worker, i)])
+
+
+@pytest.mark.parametrize("backend", ["yaml", "journal", "sqlite"])
+def test_concurrent_adds_keep_every_task(tmp_path, clikan_home, backend):
+    import multiprocessing
+    import time
+    clikan_home(backend=backend)
+    workers, count = 4, 15
+    start = time.perf_counter()
+    ctx = multiprocessing.get_context("fork")
+    processes = [ctx.Process(target=stress_worker, args=(str(tmp_path), w, count)) for w in range(workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+    assert [p.exitcode for p in processes] == [0] * workers
+
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        dd = read_data(read_config_yaml())
+    tasks = sorted(v.task for v in dd["data"].values())
+    assert tasks == sorted("w%d-%d" % (w, i) for w in range(workers) for i in range(count))
+    assert len(dd["data"]) == workers * count
+    print("%s: %d adds in %.2fs (%.0f/s)" % (backend, workers * count, elapsed, workers * count / elapsed))
+
+
+# Repaint Tests
+
+def test_repaint_reuses_loaded_board(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home("repaint: true\ncache: false\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "one"])
+        loads = []
+        load_yaml = module.load_yaml
+        monkeypatch.setattr(module, "load_yaml", lambda stream: loads.append(stream.name) or load_yaml(stream))
+        result = runner.invoke(clikan, ["promote", "1"])
+        assert result.exit_code == 0
+        assert "[1] one" in result.output
+        # The config and the data file, once each.
+        assert sorted(os.path.basename(name) for name in loads) == [".default.dat", ".default.yaml"]
+
+
+# Pagination Tests
+
+def test_split_items_formats_only_visible_rows():
+    from clikan import Entry, split_items
+    dd = {"data": {i: Entry("task %d" % i, "done" if i > 3 else "todo", "x", None) for i in range(1, 11)},
+          "deleted": {}}
+    todos, inprogs, dones = split_items(dd, limits=(None, None, 3))
+    assert todos == ["[1] task 1", "[2] task 2", "[3] task 3"]
+    assert dones == ["[4] task 4", "[5] task 5", "[6] task 6", "[dim]... 4 more[/dim]"]
+
+    todos, inprogs, dones = split_items(dd, limits=(2, 2, 2), page=2)
+    assert todos == ["[3] task 3", "[dim]... 2 more[/dim]"]
+    assert inprogs == []
+    assert dones == ["[6] task 6", "[7] task 7", "[dim]... 5 more[/dim]"]
+
+
+def test_show_limit_and_page(tmp_path, clikan_home):
+    clikan_home("limits:\n  done: 2\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        for i in range(5):
+            runner.invoke(clikan, ["add", "task %d" % i])
+        runner.invoke(clikan, ["promote", "1", "2", "3"])
+        runner.invoke(clikan, ["promote", "1", "2", "3"])
+
+        result = runner.invoke(clikan, ["show"])
+        assert "[3] task 2" not in result.output
+        assert "1 more" in result.output
+
+        result = runner.invoke(clikan, ["show", "--limit", "1", "--page", "2"])
+        assert "[2] task 1" in result.output and "[5] task 4" in result.output
+        assert "[1] task 0" not in result.output
+
+
+# Profile Tests
+
+def test_profile_reports_phases_and_restores(tmp_path, clikan_home):
+    import clikan as module
+    clikan_home()
+    original = module.read_data
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "one"])
+        stats = tmp_path / "show.pstats"
+        result = runner.invoke(clikan, ["--profile", "--profile-stats", str(stats), "show"])
+        assert result.exit_code == 0
+        assert "[1] one" in result.output
+        for phase in ("config", "read", "split", "render", "total"):
+            assert phase in result.output
+        assert stats.exists()
+    assert module.read_data is original
+
+
+# Format Version Tests
+
+def test_version_1_data_file_is_upgraded_on_read(tmp_path, clikan_home):
+    clikan_home(backend="journal")
+    data_file = tmp_path / ".default.dat"
+    data_file.write_text("data:\n  1:\n  - todo\n  - old\n  - 2024-Mar-05 10:00:00\n  - 2024-Apr-01 09:30:00\n"
+                         "  - ''\ndeleted: {}\n")
+    (tmp_path / ".default.dat.journal").write_text(
+        '["data", 2, ["done", "journaled", "2024-Mar-06 11:00:00", null, ""]]\n')
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        dd = read_data(read_config_yaml())
+        assert (dd["data"][1].last_updated, dd["data"][1].target_date) == ("2024-03-05 10:00:00", "2024-04-01 09:30:00")
+        assert dd["data"][2].last_updated == "2024-03-06 11:00:00"
+        assert data_file.read_text().startswith("version: 2\n")
+        assert "2024-04-01 09:30:00" in data_file.read_text()
+        assert not (tmp_path / ".default.dat.journal").exists()
+
+
+def test_version_1_data_file_is_migrated_as_a_stream(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home(backend="journal")
+    data_file = tmp_path / ".default.dat"
+    v1 = ("data:\n  1:\n  - todo\n  - old\n  - 2024-Mar-05 10:00:00\n  - 2024-Apr-01 09:30:00\n"
+          "  - ''\ndeleted: {}\n")
+    data_file.write_text(v1)
+    (tmp_path / ".default.dat.journal").write_text(
+        '["data", 2, ["done", "journaled", "2024-Mar-06 11:00:00", null, ""]]\n')
+    load_yaml = module.load_yaml
+
+    def load_config_only(stream):
+        assert stream.name != str(data_file), "data file loaded whole"
+        return load_yaml(stream)
+    monkeypatch.setattr(module, "load_yaml", load_config_only)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        result = runner.invoke(clikan, ["migrate"])
+        assert result.exit_code == 0, result.output
+        assert data_file.read_text() == v1
+        dd = read_data(read_config_yaml())
+        assert (dd["data"][1].last_updated, dd["data"][1].target_date) == ("2024-03-05 10:00:00", "2024-04-01 09:30:00")
+        assert dd["data"][2].last_updated == "2024-03-06 11:00:00"
+
+
+def test_version_1_data_file_exports_and_migrates_after_read(tmp_path, clikan_home):
+    clikan_home()
+    data_file = tmp_path / ".default.dat"
+    data_file.write_text("data:\n  3:\n  - todo\n  - old\n  - 2024-Mar-05 10:00:00\n  - null\n  - ''\ndeleted: {}\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        assert runner.invoke(clikan, ["show"]).exit_code == 0
+        assert "next_id: 4\n" in data_file.read_text()
+        result = runner.invoke(clikan, ["export"])
+        assert result.exit_code == 0, result.output
+        assert '"last_updated": "2024-03-05 10:00:00"' in result.output
+        result = runner.invoke(clikan, ["migrate"])
+        assert result.exit_code == 0, result.output
+        runner.invoke(clikan, ["add", "new"])
+        assert sorted(read_data(read_config_yaml())["data"]) == [3, 4]
+
+
+def test_iter_yaml_rows_skips_null_next_id():
+    from clikan import iter_yaml_rows
+    stream = io.StringIO("version: 2\ndata: {}\ndeleted: {}\nnext_id: null\n")
+    assert list(iter_yaml_rows(stream)) == []
+
+
+def test_version_1_data_file_exports_iso_timestamps(tmp_path, clikan_home):
+    clikan_home()
+    (tmp_path / ".default.dat").write_text(
+        "data:\n  1:\n  - todo\n  - old\n  - 2024-Mar-05 10:00:00\n  - 2024-Apr-01 09:30:00\n  - ''\ndeleted: {}\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        result = runner.invoke(clikan, ["export"])
+        assert result.exit_code == 0, result.output
+        assert '"last_updated": "2024-03-05 10:00:00", "target_date": "2024-04-01 09:30:00"' in result.output
+
+
+def test_version_1_sqlite_is_upgraded(tmp_path, clikan_home):
+    import sqlite3
+    db = tmp_path / "old.db"
+    conn = sqlite3.connect(str(db))
+    conn.executescript(
+        "CREATE TABLE data (id INTEGER PRIMARY KEY, status TEXT NOT NULL, task TEXT NOT NULL, last_updated TEXT,"
+        " target_date TEXT, due TEXT, description TEXT NOT NULL DEFAULT '');"
+        "INSERT INTO data VALUES (1, 'todo', 'old', '2024-Mar-05 10:00:00', '2024-Apr-01 09:30:00',"
+        " '2024-04-01 09:30:00', '');")
+    conn.commit()
+    conn.close()
+    clikan_home(data="sqlite:///%s" % db)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        entry = read_data(read_config_yaml())["data"][1]
+        assert (entry.last_updated, entry.target_date) == ("2024-03-05 10:00:00", "2024-04-01 09:30:00")
+
+
+# Search Tests
+
+def test_search_index_follows_changes(tmp_path, clikan_home):
+    from clikan import read_search_index
+    clikan_home(backend="journal")
+    data_file = tmp_path / ".default.dat"
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "Write quarterly report"])
+        runner.invoke(clikan, ["add", "Call the plumber"])
+        result = runner.invoke(clikan, ["search", "REPO"])
+        assert result.output == "[1] Write quarterly report (todo)\n"
+        assert read_search_index(str(data_file)) is not None
+
+        runner.invoke(clikan, ["edit", "2", "--desc", "about the quarterly leak"])
+        runner.invoke(clikan, ["promote", "2"])
+        runner.invoke(clikan, ["delete", "1"])
+        index = read_search_index(str(data_file))
+        assert index["words"]["data"]["leak"] == [2]
+        assert "write" not in index["words"]["data"]
+        result = runner.invoke(clikan, ["search", "quarterly"])
+        assert result.output == "[2] Call the plumber (inprogress)\n"
+
+        result = runner.invoke(clikan, ["search", "--deleted", "write", "quart"])
+        assert result.output == "[1] Write quarterly report (deleted)\n"
+        assert runner.invoke(clikan, ["search", "nothing"]).output == "No tasks match.\n"
+
+        data_file.write_text("version: 2\ndata:\n  5:\n  - todo\n  - edited by hand\n  - x\n  - null\n  - ''\n"
+                             "deleted: {}\n")
+        (tmp_path / ".default.dat.journal").unlink()
+        assert runner.invoke(clikan, ["search", "hand"]).output == "[5] edited by hand (todo)\n"
+
+
+# Watch Tests
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_watch_changes_reports_touched_files(tmp_path, backend):
+    import threading
+    from clikan import inotify_changes, poll_changes
+    watched = tmp_path / "board.dat"
+    other = tmp_path / "other.dat"
+    watched.write_text("one")
+    paths = lambda: {str(watched)}
+    if backend == "inotify":
+        changes = inotify_changes(paths)
+        try:
+            next(changes)
+        except (AttributeError, OSError):
+            pytest.skip("no inotify here")
+    else:
+        changes = poll_changes(paths, 0.01)
+
+    def save():
+        other.write_text("ignored")
+        tmp = tmp_path / "board.tmp"
+        tmp.write_text("two, a bit longer")
+        os.replace(tmp, watched)
+    timer = threading.Timer(0.1, save)
+    timer.start()
+    assert next(changes) == {str(watched)}
+    timer.join()
+
+
+def test_watched_files_maps_data_to_projects(many_projects_home):
+    from clikan import watched_files, JOURNAL_SUFFIX
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(many_projects_home)}):
+        files = watched_files(["p0", "p1", "gone"])
+    data = str(many_projects_home / ".p1.dat")
+    assert files[data] == files[data + JOURNAL_SUFFIX] == files[str(many_projects_home / ".p1.yaml")] == "p1"
+    assert set(files.values()) == {"p0", "p1", "gone"}
+
+
+# Shell Tests
+
+def test_shell_keeps_boards_until_exit(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home("repaint: true\n")
+    saves = []
+    save_data = module.save_data
+    monkeypatch.setattr(module, "save_data", lambda *args, **kwargs: saves.append(args[0]["clikan_data"]) or save_data(*args, **kwargs))
+    script = "\n".join([
+        "add one",
+        "a 'two words'",
+        "prom 1",
+        "edit 2 --desc 'more detail",
+        "shell",
+        "nosuchcommand",
+        "switch other",
+        "y",
+        "add elsewhere",
+        "switch",
+        "show",
+        "exit",
+    ])
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        read_data(read_config_yaml())
+        saves.clear()
+        result = runner.invoke(clikan, ["shell", "--debounce", "60"], input=script + "\n")
+        assert result.exit_code == 0, result.output
+        assert "Error: No closing quotation" in result.output
+        assert "shell can not run in the shell." in result.output
+        assert "clikan (other)> " in result.output
+        assert "[1] one" in result.output and "id: 1 -> elsewhere" in result.output
+        assert sorted(os.path.basename(path) for path in saves) == [".default.dat", ".other.dat"]
+
+        assert (tmp_path / ".current").read_text() == "default"
+        dd = read_data(read_config_yaml())
+        assert [(v.task, v.status) for v in dd["data"].values()] == [("one", "inprogress"), ("two words", "todo")]
+        assert module._store is None
+
+
+def test_shell_writes_boards_before_batch_and_search(tmp_path, clikan_home):
+    clikan_home()
+    operations = tmp_path / "operations.txt"
+    operations.write_text("promote 1\n")
+    script = "\n".join(["add one", "batch %s" % operations, "search one", "promote 1", "exit"])
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        result = runner.invoke(clikan, ["shell", "--debounce", "60"], input=script + "\n")
+        assert result.exit_code == 0, result.output
+        assert "Promoting task 1 to in-progress." in result.output
+        assert "[1] one (inprogress)" in result.output
+        assert read_data(read_config_yaml())["data"][1].status == "done"
+
+
+# Id Tests
+
+@pytest.mark.parametrize("backend", ["yaml", "journal", "sqlite"])
+def test_ids_stay_stable_until_renumbered(tmp_path, clikan_home, backend):
+    clikan_home(backend=backend)
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        for task in ["one", "two", "three", "four"]:
+            runner.invoke(clikan, ["add", task])
+        runner.invoke(clikan, ["delete", "4"])
+        runner.invoke(clikan, ["promote", "1", "1"])
+
+        result = runner.invoke(clikan, ["refresh"])
+        assert "Renumbered" not in result.output
+        runner.invoke(clikan, ["add", "five"])
+        dd = read_data(read_config_yaml())
+        assert {k: v.task for k, v in dd["data"].items()} == {2: "two", 3: "three", 5: "five"}
+
+        result = runner.invoke(clikan, ["refresh", "--renumber"])
+        assert result.exit_code == 0
+        assert "Renumbered tasks: 2 -> 1, 3 -> 2, 5 -> 3" in result.output
+        runner.invoke(clikan, ["add", "six"])
+        dd = read_data(read_config_yaml())
+        assert {k: v.task for k, v in dd["data"].items()} == {1: "two", 2: "three", 3: "five", 4: "six"}
+
+
+# Alias Tests
+
+def test_user_aliases_and_prefixes(tmp_path, clikan_home):
+    clikan_home()
+    aliases = tmp_path / ".aliases.ini"
+    aliases.write_text("[aliases]\nls=show\na=archive\n")
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "aliased"])
+        result = runner.invoke(clikan, ["ls"])
+        assert result.exit_code == 0 and "aliased" in result.output
+        result = runner.invoke(clikan, ["a", "search", "nothing"])
+        assert "No archived tasks match." in result.output
+        assert (tmp_path / ".cache" / "aliases.json").exists()
+
+        result = runner.invoke(clikan, ["re"])
+        assert "Too many matches: refresh, regress" in result.output
+        result = runner.invoke(clikan, ["tod"])
+        assert result.exit_code == 0
+
+        aliases.write_text("[aliases]\nls=nosuchcommand\n")
+        os.utime(aliases, ns=(0, 0))
+        result = runner.invoke(clikan, ["ls"])
+        assert result.exit_code != 0
+        result = runner.invoke(clikan, ["a", "again"])
+        assert "Creating new task w/ id: 2 -> again" in result.output
+
+
+def test_abbreviations_of_older_commands_still_resolve():
+    ctx = click.Context(clikan)
+    for name, command in [("ex", "expand"), ("exp", "expand"), ("sh", "show")]:
+        assert clikan.get_command(ctx, name).name == command
+
+
+# Dirty Tracking Tests
+
+def test_noop_commands_leave_data_file_alone(tmp_path, clikan_home):
+    clikan_home("limits:\n  todo: 1\n  taskname: 10\n")
+    data_file = tmp_path / ".default.dat"
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "only"])
+        before = os.stat(data_file)
+        lock = (tmp_path / ".default.dat.lock").read_text()
+        for argv in (["add", "over the limit"], ["add", "x" * 20], ["delete", "7"],
+                     ["promote", "9"], ["regress", "1"], ["edit", "5", "--desc", "none"]):
+            result = runner.invoke(clikan, argv)
+            assert result.exit_code == 0, argv
+        after = os.stat(data_file)
+        assert (after.st_mtime_ns, after.st_ino) == (before.st_mtime_ns, before.st_ino)
+        assert (tmp_path / ".default.dat.lock").read_text() == lock
+
+
+def test_yaml_save_serializes_only_changed_tasks(tmp_path, monkeypatch, clikan_home):
+    import clikan as module
+    clikan_home()
+    data_file = tmp_path / ".default.dat"
+    rows = {"data": {k: ["todo", "task %d" % k, "2024-03-05 10:00:00", None, "line\nbreak: %d" % k]
+                     for k in range(1, 21)},
+            "deleted": {}}
+    with open(data_file, "w") as stream:
+        module.dump_rows(rows, stream)
+    dumps = []
+    dump_rows = module.dump_rows
+    monkeypatch.setattr(module, "dump_rows", lambda *args: dumps.append(args) or dump_rows(*args))
+    runner = CliRunner()
+    with runner.isolation(env={"CLIKAN_HOME": str(tmp_path)}):
+        runner.invoke(clikan, ["add", "new one"])
+        runner.invoke(clikan, ["promote", "3"])
+        runner.invoke(clikan, ["delete", "7"])
+        runner.invoke(clikan, ["edit", "12", "--desc", "it's: done"])
+        assert dumps == []
+
+        dd = read_data(read_config_yaml())
+        assert dd["data"][12].desc == "it's: done" and dd["deleted"][7].task == "task 7"
+        full = io.StringIO()
+        dump_rows(module._loaded_rows[str(data_file)], full)
+        assert data_file.read_text() == full.getvalue()
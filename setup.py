@@ -26,7 +26,7 @@ setup(
     ],
     entry_points='''
         [console_scripts]
-        clikan=clikan:clikan
+        clikan=clikan:main
     ''',
     classifiers=[
         "License :: OSI Approved :: MIT License",